@@ -1,3 +1,4 @@
+from dataclasses import dataclass, field
 from functools import wraps
 from pathlib import Path
 from typing import Callable, Iterable, Iterator
@@ -70,3 +71,34 @@ def collect[T: Iterable, V, **P](
 def collect_sum[**P](fn: Callable[P, Iterable[int]]) -> Callable[P, int]:
     """Common use case that confuses pylance"""
     return collect(sum)(fn)  # type: ignore
+
+
+@dataclass
+class Fenwick:
+    """
+    Sparse binary indexed tree over ``range(size)``, only the touched nodes
+    are stored.
+
+    >>> tree = Fenwick(16)
+    >>> tree.add(3, 5)
+    >>> tree.add(7, 2)
+    >>> tree.prefix(3), tree.prefix(4), tree.prefix(16)
+    (0, 5, 7)
+    """
+
+    size: int
+    tree: dict[int, int] = field(default_factory=dict)
+
+    def add(self, index: int, delta: int) -> None:
+        index += 1
+        while index <= self.size:
+            self.tree[index] = self.tree.get(index, 0) + delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        """Sum over ``range(index)``."""
+        total = 0
+        while index > 0:
+            total += self.tree.get(index, 0)
+            index -= index & -index
+        return total
@@ -1,5 +1,5 @@
 from dataclasses import InitVar, dataclass, field
-from enum import Enum, auto
+from enum import Enum, StrEnum, auto
 from pathlib import Path
 from typing import Iterable, Iterator, Self, assert_never
 
@@ -8,6 +8,18 @@ from common import read_lines
 type Coord = tuple[int, int]
 type Between = tuple[Coord, Coord]
 
+EXAMPLE = [
+    "..........",
+    ".S------7.",
+    ".|F----7|.",
+    ".||....||.",
+    ".||....||.",
+    ".|L-7F-J|.",
+    ".|..||..|.",
+    ".L--JL--J.",
+    "..........",
+]
+
 
 def ilen(it: Iterable) -> int:
     return sum(1 for _ in it)
@@ -169,6 +181,99 @@ class Grid:
             assert not others
 
 
+HEADINGS = (Direction.NORTH, Direction.SOUTH, Direction.EAST, Direction.WEST)
+PIPES = set(Tile) - {Tile.GROUND, Tile.START}
+
+
+def build_turns() -> list[int]:
+    """
+    Flat (tile byte, heading) -> heading table, -1 where the pipe does not
+    accept that heading.
+    """
+    turns = [-1] * (256 * len(HEADINGS))
+    for tile in PIPES:
+        a, b = tile.movements()
+        turns[ord(tile) * 4 + HEADINGS.index(a.opposite)] = HEADINGS.index(b)
+        turns[ord(tile) * 4 + HEADINGS.index(b.opposite)] = HEADINGS.index(a)
+
+    return turns
+
+
+TURNS = build_turns()
+
+
+@dataclass
+class ByteGrid:
+    """
+    Tiles flattened into a bytearray padded with ground on every side, so
+    headings become plain index offsets with no bounds checks.
+
+    >>> grid = ByteGrid.from_lines(EXAMPLE)
+    >>> loop = grid.loop()
+    >>> len(loop), loop[:3]
+    (44, [(1, 1), (2, 1), (3, 1)])
+    >>> sorted(loop) == sorted(parse(EXAMPLE)[2])
+    True
+    """
+
+    data: bytearray
+    width: int
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> Self:
+        data = bytearray()
+        width = 0
+        for line in lines:
+            if not data:
+                width = len(line) + 2
+                data += b"." * width
+            data += b"." + line.encode() + b"."
+        data += b"." * width
+        return cls(data, width)
+
+    def __getitem__(self, coord: Coord) -> Tile:
+        row, col = coord
+        return Tile(chr(self.data[(row + 1) * self.width + col + 1]))
+
+    def coord(self, position: int) -> Coord:
+        row, col = divmod(position, self.width)
+        return row - 1, col - 1
+
+    def offsets(self) -> tuple[int, int, int, int]:
+        return -self.width, self.width, 1, -1
+
+    def resolve_start(self) -> tuple[int, int]:
+        """Replace ``S`` with the pipe that joins its neighbours."""
+        start = self.data.index(ord(Tile.START))
+        headings = [
+            heading
+            for heading, offset in enumerate(self.offsets())
+            if TURNS[self.data[start + offset] * 4 + heading] >= 0
+        ]
+        for tile in PIPES:
+            if {HEADINGS.index(d) for d in tile.movements()} == set(headings):
+                self.data[start] = ord(tile)
+                return start, headings[0]
+
+        raise ValueError(f"Start at {self.coord(start)} does not join a loop")
+
+    def follow(self, start: int, heading: int) -> Iterator[int]:
+        offsets = self.offsets()
+        data = self.data
+        position = start
+        yield position
+
+        while (position := position + offsets[heading]) != start:
+            yield position
+            heading = TURNS[data[position] * 4 + heading]
+            if heading < 0:
+                raise ValueError(f"Loop is broken at {self.coord(position)}")
+
+    def loop(self) -> list[Coord]:
+        start, heading = self.resolve_start()
+        return [self.coord(position) for position in self.follow(start, heading)]
+
+
 def super_sample(border: list[Coord]) -> Iterator[Coord]:
     for c, n in zip(border, border[1:] + [border[0]]):
         yield c[0] * 2, c[1] * 2
@@ -207,7 +312,7 @@ class SuperSample:
             queue.extend(d.move_from(coord) for d in Direction)
 
 
-def part2(grid: Grid, start: Coord, border: list[Coord]) -> int:
+def flood_fill_area(grid: Grid, start: Coord, border: list[Coord]) -> int:
     row, col = start
     starts = [
         (row * 2 + 1, col * 2 + 1),
@@ -229,12 +334,110 @@ def part2(grid: Grid, start: Coord, border: list[Coord]) -> int:
     assert False
 
 
-def run(path: Path) -> tuple[int, int]:
-    grid = Grid.from_lines(read_lines(path))
+def shoelace_area(border: list[Coord]) -> int:
+    """
+    Tiles enclosed by the loop, from its area by the shoelace formula and
+    Pick's theorem ``area = inside + border / 2 - 1``.
+
+    >>> shoelace_area([(0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0), (1, 0)])
+    1
+    """
+    twice_area = 0
+    for (r1, c1), (r2, c2) in zip(border, border[1:] + border[:1]):
+        twice_area += r1 * c2 - r2 * c1
+
+    return (abs(twice_area) - len(border)) // 2 + 1
+
+
+@dataclass
+class LoopMask:
+    """
+    One bit per tile marking the loop.
+
+    >>> mask = LoopMask.from_border([(0, 1), (2, 3)], width=4)
+    >>> (0, 1) in mask, (1, 1) in mask, (2, 3) in mask
+    (True, False, True)
+    """
+
+    bits: bytearray
+    width: int
+
+    @classmethod
+    def from_border(cls, border: Iterable[Coord], width: int) -> Self:
+        mask = cls(bytearray(), width)
+        for row, col in border:
+            index = row * width + col
+            if (missing := index // 8 + 1 - len(mask.bits)) > 0:
+                mask.bits.extend(bytes(missing))
+            mask.bits[index // 8] |= 1 << index % 8
+        return mask
+
+    def __contains__(self, coord: Coord) -> bool:
+        index = coord[0] * self.width + coord[1]
+        return index // 8 < len(self.bits) and bool(
+            self.bits[index // 8] >> index % 8 & 1
+        )
+
+
+# Counting only pipes that connect north treats L-7 and F-J runs as one
+# crossing and L-J or F-7 runs as none.
+CROSSINGS = {Tile.VERTICAL, Tile.NORTH_EAST, Tile.NORTH_WEST}
+
+
+def scanline_area(lines: Iterable[str], mask: LoopMask, start_pipe: Tile) -> int:
+    """
+    Tiles enclosed by the loop, counted one row at a time by crossing parity.
+    ``start_pipe`` is the pipe hidden under ``S`` if the rows still show it.
+    """
+    enclosed = 0
+    for row, line in enumerate(lines):
+        inside = False
+        for col, tile in enumerate(line):
+            if (row, col) not in mask:
+                enclosed += inside
+            elif (start_pipe if tile == Tile.START else tile) in CROSSINGS:
+                inside = not inside
+
+    return enclosed
+
+
+class Engine(StrEnum):
+    flood = "flood"
+    shoelace = "shoelace"
+    scanline = "scanline"
+
+
+def part2(
+    grid: Grid, start: Coord, border: list[Coord], engine: Engine = Engine.shoelace
+) -> int:
+    """
+    >>> loop = parse(EXAMPLE)
+    >>> [part2(*loop, engine=engine) for engine in Engine]
+    [4, 4, 4]
+    """
+    match engine:
+        case Engine.flood:
+            return flood_fill_area(grid, start, border)
+        case Engine.shoelace:
+            return shoelace_area(border)
+        case Engine.scanline:
+            mask = LoopMask.from_border(border, len(grid.values[0]))
+            lines = ("".join(row) for row in grid.values)
+            return scanline_area(lines, mask, grid[start])
+        case _ as other:
+            assert_never(other)
+
+
+def parse(lines: Iterable[str]) -> tuple[Grid, Coord, list[Coord]]:
+    grid = Grid.from_lines(lines)
     start = grid.find(Tile.START)
     grid[start] = start_tile(grid, start)
     direction, *_ = grid[start].movements()
 
     border = list(grid.follow(direction=direction, start=start))
+    return grid, start, border
+
 
-    return len(border) // 2, part2(grid, start, border)
+def run(path: Path) -> tuple[int, int]:
+    border = ByteGrid.from_lines(read_lines(path)).loop()
+    return len(border) // 2, shoelace_area(border)
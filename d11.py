@@ -2,11 +2,10 @@ from __future__ import annotations
 
 from collections import defaultdict
 from dataclasses import dataclass, field
-from itertools import combinations
 from pathlib import Path
 from typing import Iterable, Iterator, Self
 
-from common import collect_sum, read_lines
+from common import read_lines
 
 type Pair[T] = tuple[T, T]
 
@@ -115,23 +114,124 @@ def distance(a: Pair[int], b: Pair[int]) -> int:
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
 
-@collect_sum
-def part1(path: Path):
-    image = Image.from_lines(read_lines(path))
-    image = image.expand_columns()
-    image = image.expand_rows()
-    for coord1, coord2 in combinations(image, 2):
-        yield distance(coord1, coord2)
+def pairwise_sum(values: list[int]) -> int:
+    """
+    Sum of ``b - a`` over every pair of an ascending list, by prefix sums.
+
+    >>> pairwise_sum([1, 2, 4])
+    6
+    """
+    total, prefix = 0, 0
+    for i, value in enumerate(values):
+        total += value * i - prefix
+        prefix += value
+    return total
+
+
+def axis_sums(coords: Iterable[int]) -> Pair[int]:
+    """
+    Pairwise distance sums along one axis: the unexpanded distance and the
+    number of empty lines crossed. Expanding by ``factor`` gives
+    ``distance + (factor - 1) * empty``.
+
+    >>> axis_sums([0, 3, 3])
+    (6, 4)
+    """
+    coords = sorted(coords)
+    empties, occupied = [], 0
+    for i, coord in enumerate(coords):
+        if i and coord != coords[i - 1]:
+            occupied += 1
+        empties.append(coord - occupied)
+
+    return pairwise_sum(coords), pairwise_sum(empties)
+
+
+def distance_sums(image: Image, factors: Iterable[int]) -> list[int]:
+    """
+    >>> image = Image({(0, 0), (2, 3), (2, 5)})
+    >>> distance_sums(image, [1, 2, 10])
+    [14, 22, 86]
+    >>> from itertools import combinations
+    >>> expanded = [image.expand_rows(f).expand_columns(f) for f in [1, 2, 10]]
+    >>> [sum(distance(a, b) for a, b in combinations(e, 2)) for e in expanded]
+    [14, 22, 86]
+    """
+    rows = axis_sums(r for r, _ in image)
+    columns = axis_sums(c for _, c in image)
+    base, empty = rows[0] + columns[0], rows[1] + columns[1]
+    return [base + (factor - 1) * empty for factor in factors]
+
+
+def count_galaxies(lines: Iterable[str]) -> Pair[list[int]]:
+    """
+    Galaxies per row and per column, read in a single pass.
+
+    >>> count_galaxies(["#..", "...", "#.#"])
+    ([1, 0, 2], [2, 0, 1])
+    """
+    rows: list[int] = []
+    columns: list[int] = []
+    for line in lines:
+        if len(columns) < len(line):
+            columns.extend([0] * (len(line) - len(columns)))
+
+        count = 0
+        for col, value in enumerate(line):
+            if value == "#":
+                columns[col] += 1
+                count += 1
+        rows.append(count)
+
+    return rows, columns
+
+
+def count_sums(counts: list[int]) -> Pair[int]:
+    """
+    ``axis_sums`` from the number of galaxies on each line.
+
+    >>> count_sums([1, 0, 0, 2]) == axis_sums([0, 3, 3])
+    True
+    """
+    distance = empty = 0
+    seen = position_total = empty_total = 0
+    empties = 0
+    for position, count in enumerate(counts):
+        if not count:
+            empties += 1
+            continue
+
+        distance += count * (position * seen - position_total)
+        empty += count * (empties * seen - empty_total)
+        seen += count
+        position_total += count * position
+        empty_total += count * empties
+
+    return distance, empty
+
+
+def streamed_distance_sums(lines: Iterable[str], factors: Iterable[int]) -> list[int]:
+    """
+    ``distance_sums`` keeping only per-row and per-column galaxy counts.
+
+    >>> lines = ["#.....", "......", "...#.#"]
+    >>> streamed_distance_sums(lines, [1, 2, 10])
+    [14, 22, 86]
+    """
+    row_counts, column_counts = count_galaxies(lines)
+    rows, columns = count_sums(row_counts), count_sums(column_counts)
+    base, empty = rows[0] + columns[0], rows[1] + columns[1]
+    return [base + (factor - 1) * empty for factor in factors]
+
+
+def part1(path: Path) -> int:
+    return distance_sums(Image.from_lines(read_lines(path)), [2])[0]
 
 
-@collect_sum
-def part2(path: Path):
-    image = Image.from_lines(read_lines(path))
-    image = image.expand_columns(1000000)
-    image = image.expand_rows(1000000)
-    for coord1, coord2 in combinations(image, 2):
-        yield distance(coord1, coord2)
+def part2(path: Path) -> int:
+    return distance_sums(Image.from_lines(read_lines(path)), [1_000_000])[0]
 
 
 def run(path: Path) -> tuple[int, int]:
-    return part1(path), part2(path)
+    first, second = streamed_distance_sums(read_lines(path), [2, 1_000_000])
+    return first, second
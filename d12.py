@@ -1,7 +1,9 @@
-from functools import cache
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from itertools import product
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import Iterable, Iterator, Sequence
 
 from common import collect, collect_sum, read_lines
 
@@ -44,8 +46,7 @@ def arrangements(value: str, groups: list[int]) -> Iterator[str]:
             yield substituted
 
 
-@cache
-def possible(value: str, groups: tuple[int, ...]) -> int:
+def possible(value: str, groups: Sequence[int]) -> int:
     """
     >>> possible(".??.????????.", (2, 2, 1, 2))
     4
@@ -57,66 +58,302 @@ def possible(value: str, groups: tuple[int, ...]) -> int:
     1
     >>> possible("???????", (2, 1))
     10
-    >>> possible("?###", (3))
+    >>> possible("?###", (3,))
     1
     >>> possible("?###????", (3,2))
     2
-    >>> possible("???", (2))
+    >>> possible("???", (2,))
     2
     >>> possible("?###????????", (3,2,1))
     10
     """
-    if not groups:
-        if any(c == "#" for c in value):
-            return 0
-        return 1
+    size = len(value)
 
-    size = groups[0]
-    total: int = 0
-    for i, v in enumerate(value):
-        candidate = value[i : i + size]
-        rest = value[i + size :]
+    # Length of the run of non-"." cells starting at each position
+    run = [0] * (size + 1)
+    for i in reversed(range(size)):
+        run[i] = 0 if value[i] == "." else run[i + 1] + 1
 
-        if len(candidate) < size:
-            continue
+    # ways[i]: arrangements of the remaining groups within value[i:]
+    ways = [0] * (size + 2)
+    ways[size] = ways[size + 1] = 1
+    for i in reversed(range(size)):
+        ways[i] = ways[i + 1] if value[i] != "#" else 0
 
-        match v:
-            case ".":
-                continue
+    for group in reversed(groups):
+        placed = [0] * (size + 2)
+        for i in reversed(range(size)):
+            if value[i] != "#":
+                placed[i] = placed[i + 1]
+            end = i + group
+            if run[i] >= group and (end == size or value[end] != "#"):
+                placed[i] += ways[end + 1]
+        ways = placed
 
-            case "#":
-                # Commit to match
-                if not any(c == "." for c in candidate) and not rest.startswith("#"):
-                    total += possible(rest[1:], groups[1:])
-                break
-
-            case "?":
-                # Tentatively match
-                if any(c == "." for c in candidate):
-                    continue
+    return ways[0]
+
+
+@dataclass(frozen=True)
+class Automaton:
+    """
+    NFA over the pattern ``.#..#.`` of a group list, state ``i`` having matched
+    up to ``pattern[i]``. ``on_dot[i]`` and ``on_hash[i]`` give the next state for
+    each spring, -1 where there is none.
+
+    >>> automaton = compile_groups((1, 1, 3))
+    >>> automaton.count("???.###"), automaton.count(".??..??...?##.")
+    (1, 4)
+    """
+
+    on_dot: tuple[int, ...]
+    on_hash: tuple[int, ...]
 
-                if rest.startswith("#"):
+    def count(self, springs: str) -> int:
+        size = len(self.on_dot)
+        counts = [0] * size
+        counts[0] = 1
+        for position, spring in enumerate(springs):
+            # States that are reachable yet and can still reach the end
+            low = max(size - 2 - (len(springs) - position), 0)
+            high = min(position + 1, size)
+            advanced = [0] * size
+            for state in range(low, high):
+                if not (count := counts[state]):
                     continue
+                if spring != "#" and (target := self.on_dot[state]) >= 0:
+                    advanced[target] += count
+                if spring != "." and (target := self.on_hash[state]) >= 0:
+                    advanced[target] += count
+            counts = advanced
+
+        return counts[-1] + counts[-2]
+
+
+@lru_cache(maxsize=4096)
+def compile_groups(groups: tuple[int, ...]) -> Automaton:
+    pattern = "." + ".".join("#" * size for size in groups) + "."
+    on_dot, on_hash = [], []
+    for state, current in enumerate(pattern):
+        following = pattern[state + 1] if state + 1 < len(pattern) else ""
+        match current:
+            case ".":
+                on_dot.append(state)
+                on_hash.append(state + 1 if following == "#" else -1)
+            case "#":
+                on_dot.append(state + 1 if following == "." else -1)
+                on_hash.append(state + 1 if following == "#" else -1)
+
+    return Automaton(tuple(on_dot), tuple(on_hash))
+
+
+def hit_rate() -> float:
+    """Share of ``compile_groups`` calls served from the cache."""
+    info = compile_groups.cache_info()
+    calls = info.hits + info.misses
+    return info.hits / calls if calls else 0.0
+
+
+# Position in the repeating group list: the phase of the group being matched
+# and how many of its springs are placed, -1 right after a group closes.
+type State = tuple[int, int]
+type Counts = dict[tuple[int, State], int]
+type Matrix = list[list[int]]
+# Boundary between copies: groups completed beyond one pass per copy so far,
+# and the state there.
+type Node = tuple[int, State]
+
+
+def multiply(a: Matrix, b: Matrix) -> Matrix:
+    return [
+        [sum(x * y for x, y in zip(row, column)) for column in zip(*b)] for row in a
+    ]
+
+
+def matrix_power(matrix: Matrix, exponent: int) -> Matrix:
+    """
+    >>> matrix_power([[1, 1], [1, 0]], 10)
+    [[89, 55], [55, 34]]
+    """
+    assert exponent >= 0
+    result = [[int(i == j) for j in range(len(matrix))] for i in range(len(matrix))]
+    while exponent:
+        if exponent & 1:
+            result = multiply(result, matrix)
+        matrix = multiply(matrix, matrix)
+        exponent >>= 1
+    return result
+
+
+@dataclass
+class Unfolded:
+    """
+    Arrangements of ``springs`` unfolded ``copies`` times.
+
+    Every copy after the first is the same ``?`` + springs step between
+    boundary nodes, a node pairing the state with how far the groups completed
+    are ahead of one pass per copy. Groups can slide from one copy into the
+    next, but where that offset cannot drift both ways without bound only a
+    finite set of nodes lies between the first copy and a finished row, and
+    the step is a transfer matrix over them raised to the required power by
+    squaring. Otherwise no finite matrix exists and the joined row is counted
+    by its automaton, which stays quadratic in ``copies``: a few seconds at a
+    few hundred copies, minutes in the thousands.
+
+    >>> Unfolded(".??..??...?##.", (1, 1, 3)).count(5)
+    16384
+    >>> Unfolded("?###????????", (3, 2, 1)).count(5)
+    506250
+    >>> Unfolded(".??..??...?##.", (1, 1, 3)).count(1000) == 4 * 8**999
+    True
+    >>> joined = "?".join(["???#??????"] * 9)
+    >>> Unfolded("???#??????", (4, 4)).count(9) == possible(joined, (4, 4) * 9)
+    True
+    >>> Unfolded("??", (1,)).count(7) == possible("?".join(["??"] * 7), (1,) * 7)
+    True
+    >>> Unfolded("??", (1,)).count(0)
+    Traceback (most recent call last):
+        ...
+    ValueError: Cannot unfold 0 times
+    """
+
+    springs: str
+    groups: tuple[int, ...]
+
+    def states(self) -> Iterator[State]:
+        for phase, size in enumerate(self.groups):
+            for placed in range(-1, size):
+                yield phase, placed
+
+    def advance(self, counts: Counts, spring: str) -> Counts:
+        result: Counts = defaultdict(int)
+        for (done, (phase, placed)), count in counts.items():
+            if spring != "#" and placed <= 0:
+                result[done, (phase, 0)] += count
+
+            if spring != "." and placed >= 0:
+                if placed + 1 == self.groups[phase]:
+                    next_phase = (phase + 1) % len(self.groups)
+                    result[done + 1, (next_phase, -1)] += count
+                else:
+                    result[done, (phase, placed + 1)] += count
+
+        return result
+
+    def walk(self, springs: str, counts: Counts) -> Counts:
+        for spring in springs:
+            counts = self.advance(counts, spring)
+        return {key: count for key, count in counts.items() if count}
+
+    @cached_property
+    def first(self) -> dict[Node, int]:
+        counts = self.walk(self.springs, {(0, (0, 0)): 1})
+        return {
+            (done - len(self.groups), end): count
+            for (done, end), count in counts.items()
+        }
 
-                total += possible(rest[1:], groups[1:])
-    return total
+    @cached_property
+    def step(self) -> dict[State, Counts]:
+        """Offset shift and end state of every ``?`` + springs step."""
+        return {
+            state: {
+                (done - len(self.groups), end): count
+                for (done, end), count in self.walk(
+                    "?" + self.springs, {(0, state): 1}
+                ).items()
+            }
+            for state in self.states()
+        }
+
+    @cached_property
+    def stride(self) -> int:
+        """Largest change of offset in a single step."""
+        shifts = (shift for counts in self.step.values() for shift, _ in counts)
+        return max(map(abs, shifts), default=0)
+
+    def live(self, limit: int) -> set[Node]:
+        """Nodes within ``limit`` of a zero offset on a path to a finished row."""
+        reachable = set(self.first)
+        queue = list(reachable)
+        while queue:
+            offset, state = queue.pop()
+            for shift, end in self.step[state]:
+                node = offset + shift, end
+                if abs(node[0]) <= limit and node not in reachable:
+                    reachable.add(node)
+                    queue.append(node)
+
+        previous = defaultdict(list)
+        for state, counts in self.step.items():
+            for shift, end in counts:
+                previous[end].append((shift, state))
+
+        finishing = {(0, state) for state in self.step if state[1] <= 0}
+        queue = list(finishing)
+        while queue:
+            offset, end = queue.pop()
+            for shift, state in previous[end]:
+                node = offset - shift, state
+                if abs(node[0]) <= limit and node not in finishing:
+                    finishing.add(node)
+                    queue.append(node)
+
+        return reachable & finishing
+
+    @cached_property
+    def bounded(self) -> list[Node] | None:
+        """
+        The live nodes, or ``None`` when the offset can drift both ways. Without
+        an increasing cycle, or without a decreasing one, no live offset lies
+        further than one step per state from zero.
+        """
+        bound = len(self.step) * self.stride
+        live = self.live(2 * bound + self.stride)
+        if any(abs(offset) > bound for offset, _ in live):
+            return None
+        return sorted(live)
+
+    def count(self, copies: int) -> int:
+        if copies < 1:
+            raise ValueError(f"Cannot unfold {copies} times")
+
+        if not self.groups:
+            return int("#" not in self.springs)
+
+        if (live := self.bounded) is None:
+            joined = "?".join([self.springs] * copies)
+            return compile_groups(self.groups * copies).count(joined)
+
+        index = {node: i for i, node in enumerate(live)}
+        matrix = [[0] * len(index) for _ in index]
+        for (offset, state), i in index.items():
+            for (shift, end), count in self.step[state].items():
+                if (node := (offset + shift, end)) in index:
+                    matrix[i][index[node]] += count
+
+        power = matrix_power(matrix, copies - 1)
+        return sum(
+            count * power[index[start]][index[end]]
+            for start, count in self.first.items()
+            if start in index
+            for end in live
+            if end[0] == 0 and end[1][1] <= 0
+        )
 
 
 @collect_sum
 def part1(path: Path):
     for line in read_lines(path):
         springs, groups = line.split(" ")
-        yield possible(springs, map(int, groups.split(",")))
+        yield compile_groups(tuple(map(int, groups.split(",")))).count(springs)
 
 
 @collect_sum
 def part2(path: Path):
     for line in read_lines(path):
         springs, groups = line.split(" ")
-        yield possible(
-            "?".join(springs for _ in range(5)),
-            tuple(map(int, groups.split(","))) * 5,
-        )
+        automaton = compile_groups(tuple(map(int, groups.split(","))) * 5)
+        yield automaton.count("?".join(springs for _ in range(5)))
 
 
 def run(path: Path) -> tuple[int, int]:
@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import Iterable, Iterator, Self
 from itertools import chain, groupby
 
+import numpy as np
+
 from common import collect_sum, read_lines
 
 
@@ -36,6 +38,23 @@ class Grid:
     def display(self) -> str:
         return "\n".join("".join(line) for line in self.data)
 
+    def masks(self) -> tuple[list[int], list[int]]:
+        """
+        Rows and columns as integers with a bit set for every rock.
+
+        >>> Grid.from_lines(["#.", "##", ".."]).masks()
+        ([1, 3, 0], [3, 2])
+        """
+        rows = [
+            sum(1 << col for col, tile in enumerate(row) if tile == Tile.rock)
+            for row in self.data
+        ]
+        columns = [
+            sum(1 << row for row, mask in enumerate(rows) if mask >> col & 1)
+            for col in range(len(self.data[0]))
+        ]
+        return rows, columns
+
 
 @dataclass
 class ColumnView[T]:
@@ -89,6 +108,271 @@ def smudges(slices: RowView | ColumnView) -> Iterator[int]:
             yield i
 
 
+def mirror_errors(masks: list[int], limit: int = 1) -> list[int]:
+    """
+    Differing tiles across every axis, counted up to ``limit + 1``.
+
+    >>> mirror_errors([0b101, 0b101, 0b100, 0b110])
+    [0, 3, 1]
+    """
+    errors = []
+    for axis in range(1, len(masks)):
+        count = 0
+        for before, after in zip(reversed(masks[:axis]), masks[axis:]):
+            count += (before ^ after).bit_count()
+            if count > limit:
+                break
+        errors.append(count)
+    return errors
+
+
+def axes(errors: list[int], target: int) -> Iterator[int]:
+    return (axis for axis, count in enumerate(errors, 1) if count == target)
+
+
+def scores(grid: Grid) -> tuple[int, int]:
+    """Reflection and smudge scores from a single encoding of the grid."""
+    rows, columns = grid.masks()
+    row_errors, column_errors = mirror_errors(rows), mirror_errors(columns)
+    reflection = score(axes(column_errors, 0), axes(row_errors, 0))
+    smudge = score(axes(column_errors, 1), axes(row_errors, 1))
+    return reflection, smudge
+
+
+def mirror_radii(masks: list[int]) -> list[int]:
+    """
+    Manacher's algorithm for even palindromes: ``radii[axis]`` is how many
+    pairs mirror exactly around the gap before ``masks[axis]``.
+
+    >>> mirror_radii([1, 2, 2, 1, 5])
+    [0, 0, 2, 0, 0]
+    """
+    radii = [0] * len(masks)
+    center = reach = 0
+    for axis in range(1, len(masks)):
+        radius = min(radii[2 * center - axis], reach - axis) if axis < reach else 0
+        while (
+            axis - 1 - radius >= 0
+            and axis + radius < len(masks)
+            and masks[axis - 1 - radius] == masks[axis + radius]
+        ):
+            radius += 1
+        radii[axis] = radius
+        if axis + radius > reach:
+            center, reach = axis, axis + radius
+
+    return radii
+
+
+HASH_MODULUS = (1 << 61) - 1
+HASH_BASE = 1_000_003
+
+
+@dataclass
+class RollingHash:
+    """
+    Polynomial hashes of every prefix of the masks and of their reverse, so
+    any run of masks can be compared with a mirrored run in O(1).
+
+    >>> hashes = RollingHash.from_masks([1, 2, 3, 2, 1])
+    >>> hashes.forward(0, 2) == hashes.backward(3, 5)
+    True
+    """
+
+    prefix: list[int]
+    suffix: list[int]
+    powers: list[int]
+
+    @classmethod
+    def from_masks(cls, masks: list[int]) -> Self:
+        prefix, suffix, powers = [0], [0], [1]
+        for forward, backward in zip(masks, reversed(masks)):
+            prefix.append((prefix[-1] * HASH_BASE + forward) % HASH_MODULUS)
+            suffix.append((suffix[-1] * HASH_BASE + backward) % HASH_MODULUS)
+            powers.append(powers[-1] * HASH_BASE % HASH_MODULUS)
+        return cls(prefix, suffix, powers)
+
+    def forward(self, start: int, stop: int) -> int:
+        """Hash of ``masks[start:stop]``."""
+        width = self.powers[stop - start]
+        return (self.prefix[stop] - self.prefix[start] * width) % HASH_MODULUS
+
+    def backward(self, start: int, stop: int) -> int:
+        """Hash of ``masks[start:stop]`` read in reverse."""
+        size = len(self.prefix) - 1
+        start, stop = size - stop, size - start
+        width = self.powers[stop - start]
+        return (self.suffix[stop] - self.suffix[start] * width) % HASH_MODULUS
+
+
+def mirror_axes(masks: list[int]) -> tuple[list[int], list[int]]:
+    """
+    Reflection and smudge axes in O(n) hashing work for n masks.
+
+    Reflections are gaps whose palindrome radius reaches an edge. A smudge
+    axis first breaks on a pair one bit apart; the rest of its span is
+    compared by hash and only matching candidates are checked exactly.
+
+    >>> mirror_axes([0b101, 0b101, 0b100, 0b110])
+    ([1], [3])
+    """
+    radii = mirror_radii(masks)
+    hashes = RollingHash.from_masks(masks)
+    reflections, smudges = [], []
+    for axis in range(1, len(masks)):
+        span = min(axis, len(masks) - axis)
+        radius = radii[axis]
+        if radius == span:
+            reflections.append(axis)
+            continue
+
+        left, right = axis - 1 - radius, axis + radius
+        if (masks[left] ^ masks[right]).bit_count() != 1:
+            continue
+
+        # Remaining pairs: masks[axis - span : left] mirrored onto right + 1 onwards
+        start, stop = axis - span, axis + span
+        if hashes.backward(start, left) != hashes.forward(right + 1, stop):
+            continue
+        if masks[start:left][::-1] == masks[right + 1 : stop]:
+            smudges.append(axis)
+
+    return reflections, smudges
+
+
+def hashed_scores(grid: Grid) -> tuple[int, int]:
+    """
+    ``scores`` for very large patterns.
+
+    >>> grid = Grid.from_lines(
+    ...     [
+    ...         "#.##..##.",
+    ...         "..#.##.#.",
+    ...         "##......#",
+    ...         "##......#",
+    ...         "..#.##.#.",
+    ...         "..##..##.",
+    ...         "#.#.##.#.",
+    ...     ]
+    ... )
+    >>> hashed_scores(grid), scores(grid)
+    ((5, 300), (5, 300))
+    """
+    rows, columns = grid.masks()
+    row_reflections, row_smudges = mirror_axes(rows)
+    column_reflections, column_smudges = mirror_axes(columns)
+    return (
+        score(column_reflections, row_reflections),
+        score(column_smudges, row_smudges),
+    )
+
+
+def pad_patterns(
+    patterns: list[list[str]],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Patterns as one uint8 array of rocks padded with ash, plus their sizes.
+
+    >>> rocks, heights, widths = pad_patterns([["#.", ".."], ["###"]])
+    >>> rocks.tolist(), heights.tolist(), widths.tolist()
+    ([[[1, 0, 0], [0, 0, 0]], [[1, 1, 1], [0, 0, 0]]], [2, 1], [2, 3])
+    """
+    heights = np.array([len(pattern) for pattern in patterns])
+    widths = np.array([len(pattern[0]) for pattern in patterns])
+    rocks = np.zeros((len(patterns), heights.max(), widths.max()), dtype=np.uint8)
+    for i, pattern in enumerate(patterns):
+        rocks[i, : len(pattern), : len(pattern[0])] = [
+            [tile == Tile.rock for tile in line] for line in pattern
+        ]
+    return rocks, heights, widths
+
+
+def axis_errors(rocks: np.ndarray, heights: np.ndarray) -> np.ndarray:
+    """
+    Differing tiles across every row axis of every pattern, -1 where the axis
+    lies outside the pattern. ``errors[b, axis - 1]`` is for the gap before
+    row ``axis``.
+
+    >>> axis_errors(np.array([[[1, 0], [1, 0], [1, 1], [0, 0]]]), np.array([3]))
+    array([[ 0,  1, -1]])
+    >>> axis_errors(np.array([[[1, 0]]]), np.array([1]))
+    array([], shape=(1, 0), dtype=int64)
+    """
+    size = rocks.shape[1]
+    # Tiles differing between every pair of rows of each pattern
+    differences = (rocks[:, :, None, :] != rocks[:, None, :, :]).sum(axis=3)
+
+    gaps, lows, highs = [], [], []
+    for axis in range(1, size):
+        for offset in range(min(axis, size - axis)):
+            gaps.append(axis - 1)
+            lows.append(axis - 1 - offset)
+            highs.append(axis + offset)
+    axes = np.array(gaps, dtype=np.intp)
+    before = np.array(lows, dtype=np.intp)
+    after = np.array(highs, dtype=np.intp)
+
+    pairs = differences[:, before, after] * (after[None, :] < heights[:, None])
+    errors = np.zeros((len(rocks), size - 1), dtype=np.int64)
+    np.add.at(errors.T, axes, pairs.T)
+
+    outside = np.arange(1, size)[None, :] >= heights[:, None]
+    errors[outside] = -1
+    return errors
+
+
+def first_axes(errors: np.ndarray, target: int) -> tuple[np.ndarray, np.ndarray]:
+    """First axis with ``target`` errors per pattern, and whether there is one."""
+    hits = errors == target
+    if not hits.shape[1]:
+        return np.zeros(len(hits), dtype=np.intp), np.zeros(len(hits), dtype=bool)
+    return hits.argmax(axis=1) + 1, hits.any(axis=1)
+
+
+def array_scores(patterns: list[list[str]]) -> tuple[int, int]:
+    """
+    Summed reflection and smudge scores of every pattern in a few array passes.
+
+    >>> first = [
+    ...     "#.##..##.",
+    ...     "..#.##.#.",
+    ...     "##......#",
+    ...     "##......#",
+    ...     "..#.##.#.",
+    ...     "..##..##.",
+    ...     "#.#.##.#.",
+    ... ]
+    >>> second = [
+    ...     "#...##..#",
+    ...     "#....#..#",
+    ...     "..##..###",
+    ...     "#####.##.",
+    ...     "#####.##.",
+    ...     "..##..###",
+    ...     "#....#..#",
+    ... ]
+    >>> array_scores([first, second])
+    (405, 400)
+    >>> array_scores([["#.", ".#"]])
+    Traceback (most recent call last):
+        ...
+    ValueError: No reflection in pattern 0
+    """
+    rocks, heights, widths = pad_patterns(patterns)
+    row_errors = axis_errors(rocks, heights)
+    column_errors = axis_errors(rocks.transpose(0, 2, 1), widths)
+
+    totals = []
+    for target in (0, 1):
+        column, has_column = first_axes(column_errors, target)
+        row, has_row = first_axes(row_errors, target)
+        if (missing := ~(has_column | has_row)).any():
+            raise ValueError(f"No reflection in pattern {missing.argmax()}")
+        totals.append(int(np.where(has_column, column, 100 * row).sum()))
+
+    return totals[0], totals[1]
+
+
 def split_inputs(lines: Iterator[str]) -> Iterator[list[str]]:
     """
     >>> list(split_inputs(["A", "", "B", "C"]))
@@ -106,13 +390,13 @@ def score(columns: Iterable[int], rows: Iterable[int]) -> int:
 @collect_sum
 def part1(grids: Iterable[Grid]) -> Iterator[int]:
     for grid in grids:
-        yield score(reflections(grid.columns()), reflections(grid.rows()))
+        yield scores(grid)[0]
 
 
 @collect_sum
 def part2(grids: Iterable[Grid]) -> Iterator[int]:
     for grid in grids:
-        yield score(smudges(grid.columns()), smudges(grid.rows()))
+        yield scores(grid)[1]
 
 
 def get_grids(path: Path) -> Iterator[Grid]:
@@ -120,5 +404,10 @@ def get_grids(path: Path) -> Iterator[Grid]:
         yield Grid.from_lines(group)
 
 
+def array_run(path: Path) -> tuple[int, int]:
+    return array_scores(list(split_inputs(read_lines(path))))
+
+
 def run(path: Path) -> tuple[int, int]:
-    return part1(get_grids(path)), part2(get_grids(path))
+    reflection, smudge = zip(*map(scores, get_grids(path)))
+    return sum(reflection), sum(smudge)
@@ -1,13 +1,29 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import random
+from dataclasses import dataclass, field, replace
 from enum import StrEnum
 from itertools import count
 from pathlib import Path
 from typing import Iterable, Iterator, Self, assert_never
 
+import numpy as np
+
 from common import collect_sum, read_lines
 
+EXAMPLE = [
+    "O....#....",
+    "O.OO#....#",
+    ".....##...",
+    "OO.#O....O",
+    ".O.....O#.",
+    "O.#..O.#.#",
+    "..O..#O..O",
+    ".......O..",
+    "#....###..",
+    "#OO..#....",
+]
+
 
 class Tile(StrEnum):
     empty = "."
@@ -190,5 +206,333 @@ def part2(path: Path) -> int:
     return score(grid)
 
 
+class Direction(StrEnum):
+    north = "N"
+    west = "W"
+    south = "S"
+    east = "E"
+
+    @property
+    def vertical(self) -> bool:
+        return self in (Direction.north, Direction.south)
+
+    @property
+    def low(self) -> bool:
+        """Rocks roll towards bit 0 of the line."""
+        return self in (Direction.north, Direction.west)
+
+
+SPIN = (Direction.north, Direction.west, Direction.south, Direction.east)
+
+# Mersenne prime modulus for 127 bit column fingerprints
+FINGERPRINT_MODULUS = (1 << 127) - 1
+
+
+def unpack(lines: list[int], size: int) -> np.ndarray:
+    """
+    Bitboards as a boolean array, one row per line and bit ``i`` in column ``i``.
+
+    >>> unpack([0b011, 0b100], 3).astype(int)
+    array([[1, 1, 0],
+           [0, 0, 1]])
+    """
+    width = (size + 7) // 8
+    data = b"".join(line.to_bytes(width, "little") for line in lines)
+    packed = np.frombuffer(data, dtype=np.uint8).reshape(len(lines), width)
+    return np.unpackbits(packed, axis=1, count=size, bitorder="little").view(bool)
+
+
+def pack(bits: np.ndarray) -> list[int]:
+    """
+    >>> pack(np.array([[1, 1, 0], [0, 0, 1]], dtype=bool))
+    [3, 4]
+    """
+    packed = np.packbits(bits, axis=1, bitorder="little")
+    data, width = packed.tobytes(), packed.shape[1]
+    return [
+        int.from_bytes(data[i : i + width], "little")
+        for i in range(0, len(data), width)
+    ]
+
+
+@dataclass(frozen=True)
+class Segments:
+    """
+    Runs of free cells along every line of a grid, flattened line by line,
+    each run taking the cube rocks that close it. The runs cover the grid, so
+    a tilt is one count of the rocks in every run followed by a comparison of
+    every cell's offset in its run against that count.
+
+    >>> segments = Segments.from_cubes(np.array([[0, 0, 1, 0, 0]], dtype=bool))
+    >>> lines = np.array([[0, 1, 0, 0, 1]], dtype=bool)
+    >>> segments.slide(lines, low=True).astype(int)
+    array([[1, 0, 0, 1, 0]])
+    >>> segments.slide(lines, low=False).astype(int)
+    array([[0, 1, 0, 0, 1]])
+    """
+
+    starts: np.ndarray
+    lengths: np.ndarray
+    offsets: np.ndarray
+    free: np.ndarray
+    free_lengths: np.ndarray
+
+    @classmethod
+    def from_cubes(cls, cubes: np.ndarray) -> Self:
+        first = np.ones_like(cubes)
+        first[:, 1:] = ~cubes[:, 1:] & cubes[:, :-1]
+        starts = np.flatnonzero(first)
+        lengths = np.diff(starts, append=cubes.size)
+        offsets = np.arange(cubes.size) - np.repeat(starts, lengths)
+        free = ~cubes.ravel()
+        free_lengths = np.add.reduceat(free, starts, dtype=np.int32)
+        return cls(starts, lengths, offsets.astype(np.int32), free, free_lengths)
+
+    def slide(self, lines: np.ndarray, low: bool) -> np.ndarray:
+        """Roll the rocks in ``lines`` towards index 0 if ``low``, else away."""
+        counts = np.add.reduceat(lines.ravel(), self.starts, dtype=np.int32)
+        if low:
+            rolled = self.offsets < np.repeat(counts, self.lengths)
+        else:
+            highest = np.repeat(self.free_lengths - counts, self.lengths)
+            rolled = (self.offsets >= highest) & self.free
+        return rolled.reshape(lines.shape)
+
+
+@dataclass
+class BitGrid:
+    """
+    Rounded rocks as one bitboard per column, bit ``r`` for row ``r``. Cube
+    rocks never move, so the free segments of every row and column are
+    computed once, and tilts run on the unpacked boards in NumPy.
+
+    >>> grid = BitGrid.from_lines(["O.#", "O..", ".O."])
+    >>> grid.tilt_north().load()
+    8
+    >>> grid.spin().load()
+    4
+    """
+
+    height: int
+    width: int
+    columns: list[int]
+    column_segments: Segments = field(repr=False)
+    row_segments: Segments = field(repr=False)
+    keys: list[int] = field(repr=False)
+    fingerprint: int = 0
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> Self:
+        tiles = np.array([list(line) for line in lines])
+        height, width = tiles.shape
+        cubes = tiles == Tile.cubed
+        keys = random.Random(0)
+        grid = cls(
+            height,
+            width,
+            pack((tiles == Tile.rounded).T),
+            Segments.from_cubes(cubes.T),
+            Segments.from_cubes(cubes),
+            [keys.randrange(1, FINGERPRINT_MODULUS) for _ in range(width)],
+        )
+        grid.rehash([0] * width)
+        return grid
+
+    def copy(self) -> Self:
+        return replace(self, columns=list(self.columns))
+
+    def rehash(self, before: list[int]) -> None:
+        """
+        Zobrist-style update after the columns change: every column that moved
+        swaps its old hash for the new one in the XOR of all column hashes.
+        """
+        for key, old, new in zip(self.keys, before, self.columns):
+            if old != new:
+                self.fingerprint ^= old * key % FINGERPRINT_MODULUS
+                self.fingerprint ^= new * key % FINGERPRINT_MODULUS
+
+    def tilt_north(self) -> Self:
+        return self.spin((Direction.north,))
+
+    def spin(self, directions: tuple[Direction, ...] = SPIN) -> Self:
+        """
+        Tilt in each direction in turn, only transposing when the tilt axis
+        changes.
+
+        >>> grid = BitGrid.from_lines(EXAMPLE)
+        >>> grid.spin((Direction.south, Direction.north)).load()
+        136
+        >>> lines = ["..", "O.", "#O"]
+        >>> grid = BitGrid.from_lines(lines).spin((Direction.east,))
+        >>> rows = [tilt(row[::-1])[::-1] for row in Grid.from_lines(lines).rows()]
+        >>> grid.load(), score(Grid(rows))
+        (3, 3)
+        """
+        before = self.columns
+        lines = unpack(self.columns, self.height)
+        vertical = True
+        for direction in directions:
+            if direction.vertical != vertical:
+                vertical, lines = direction.vertical, lines.T
+
+            segments = self.column_segments if vertical else self.row_segments
+            lines = segments.slide(lines, direction.low)
+
+        self.columns = pack(lines if vertical else lines.T)
+        self.rehash(before)
+        return self
+
+    def repeats(self, length: int, directions: tuple[Direction, ...] = SPIN) -> bool:
+        probe = self.copy()
+        for _ in range(length):
+            probe.spin(directions)
+        return probe.state() == self.state()
+
+    def load(self) -> int:
+        rounded = unpack(self.columns, self.height).sum(axis=0)
+        return int(rounded @ np.arange(self.height, 0, -1))
+
+    def state(self) -> tuple[int, ...]:
+        return tuple(self.columns)
+
+
+@dataclass
+class LoadHistory:
+    """
+    North load after every spin count, stored as the loads before the cycle
+    and the loads round one period, so any spin count is answered by indexing.
+
+    >>> history = LoadHistory.simulate(BitGrid.from_lines(EXAMPLE))
+    >>> history.start, history.length
+    (3, 7)
+    >>> history[1_000_000_000]
+    64
+    >>> history.batch([0, 1, 3, 10, 17])
+    [104, 87, 69, 69, 69]
+    """
+
+    prefix: list[int]
+    cycle: list[int]
+
+    @property
+    def start(self) -> int:
+        return len(self.prefix)
+
+    @property
+    def length(self) -> int:
+        return len(self.cycle)
+
+    def __getitem__(self, spins: int) -> int:
+        if spins < self.start:
+            return self.prefix[spins]
+        return self.cycle[(spins - self.start) % self.length]
+
+    def batch(self, spins: Iterable[int]) -> list[int]:
+        return [self[n] for n in spins]
+
+    @classmethod
+    def simulate(cls, grid: BitGrid, directions: tuple[Direction, ...] = SPIN) -> Self:
+        """
+        Spin until a fingerprint repeats. The first repeat marks the end of
+        the pre-period, which is confirmed exactly by spinning a copy of the
+        starting grid up to the earlier sighting and comparing states.
+        """
+        initial = grid.copy()
+        seen = {grid.fingerprint: 0}
+        loads = [grid.load()]
+        for spins in count(1):
+            grid.spin(directions)
+            if (previous := seen.get(grid.fingerprint)) is not None:
+                probe = initial.copy()
+                for _ in range(previous):
+                    probe.spin(directions)
+                if probe.state() == grid.state():
+                    return cls(loads[:previous], loads[previous:])
+
+            seen[grid.fingerprint] = spins
+            loads.append(grid.load())
+
+        assert False
+
+    @classmethod
+    def from_cycle(
+        cls,
+        grid: BitGrid,
+        start: int,
+        length: int,
+        directions: tuple[Direction, ...] = SPIN,
+    ) -> Self:
+        loads = [grid.load()]
+        for _ in range(start + length - 1):
+            loads.append(grid.spin(directions).load())
+        return cls(loads[:start], loads[start:])
+
+
+def fingerprint_cycle(
+    grid: BitGrid, directions: tuple[Direction, ...] = SPIN
+) -> tuple[int, int]:
+    """
+    Exact pre-period and period, storing only fingerprints while searching.
+
+    >>> fingerprint_cycle(BitGrid.from_lines(EXAMPLE))
+    (3, 7)
+    """
+    history = LoadHistory.simulate(grid, directions)
+    return history.start, history.length
+
+
+def brent_cycle(
+    grid: BitGrid, directions: tuple[Direction, ...] = SPIN
+) -> tuple[int, int]:
+    """
+    Brent's algorithm, keeping at most three grids at once. Returns the exact
+    pre-period and period.
+
+    >>> brent_cycle(BitGrid.from_lines(EXAMPLE))
+    (3, 7)
+    """
+    power = length = 1
+    tortoise, hare = grid.copy(), grid.copy().spin(directions)
+    while tortoise.state() != hare.state():
+        if power == length:
+            tortoise, power, length = hare.copy(), power * 2, 0
+        hare.spin(directions)
+        length += 1
+
+    tortoise, hare = grid.copy(), grid.copy()
+    for _ in range(length):
+        hare.spin(directions)
+
+    start = 0
+    while tortoise.state() != hare.state():
+        tortoise.spin(directions)
+        hare.spin(directions)
+        start += 1
+
+    return start, length
+
+
+class Detector(StrEnum):
+    fingerprint = "fingerprint"
+    brent = "brent"
+
+
+def bit_part2(
+    path: Path,
+    detector: Detector = Detector.fingerprint,
+    spins: int = 1_000_000_000,
+) -> int:
+    grid = BitGrid.from_lines(read_lines(path))
+    match detector:
+        case Detector.fingerprint:
+            history = LoadHistory.simulate(grid)
+        case Detector.brent:
+            history = LoadHistory.from_cycle(grid.copy(), *brent_cycle(grid))
+        case _ as other:
+            assert_never(other)
+
+    return history[spins]
+
+
 def run(path: Path) -> tuple[int, int]:
-    return part1(path), part2(path)
+    return BitGrid.from_lines(read_lines(path)).tilt_north().load(), bit_part2(path)
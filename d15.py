@@ -1,7 +1,25 @@
-from collections import defaultdict
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import groupby, islice
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Sequence
+
+import numpy as np
+
+from common import Fenwick
+
+BUFFER_SIZE = 1 << 16
+BOX_COUNT = 256
+MIN_BOX_CAPACITY = 16
 
-from common import collect_sum
+EXAMPLE = b"rn=1,cm-,qp=3,cm=2,qp-,pc=4,ot=9,ab=5,pc-,pc=6,ot=7"
+
+# Next HASH state for every (state, byte) pair, at index ``state << 8 | byte``
+HASH_TABLE = bytes(
+    (state + byte) * 17 % 256 for state in range(256) for byte in range(256)
+)
 
 
 def hash_algorithm(string: str) -> int:
@@ -9,38 +27,214 @@ def hash_algorithm(string: str) -> int:
     >>> hash_algorithm("HASH")
     52
     """
-    current_value = 0
-    for c in string:
-        current_value += ord(c)
-        current_value *= 17
-        current_value %= 256
+    return hash_bytes(string.encode())
 
-    return current_value
 
+def hash_bytes(data: bytes, state: int = 0) -> int:
+    """
+    HASH continued from ``state``, one table lookup per byte.
 
-def part1(path: Path):
-    return sum(map(hash_algorithm, path.read_text().split(",")))
+    >>> hash_bytes(b"HASH")
+    52
+    >>> hash_bytes(b"SH", hash_bytes(b"HA"))
+    52
+    """
+    for byte in data:
+        state = HASH_TABLE[state << 8 | byte]
 
+    return state
 
-@collect_sum
-def part2(path: Path):
-    hashmap = {}
-    for value in path.read_text().split(","):
-        if value.endswith("-"):
-            hashmap.pop(value[:-1], None)
-            continue
 
-        label, lens = value.split("=")
-        hashmap[label] = int(lens)
+@lru_cache(maxsize=4096)
+def hash_label(label: bytes) -> int:
+    return hash_bytes(label)
+
+
+def hash_array(labels: Sequence[bytes]) -> np.ndarray:
+    """
+    HASH of every label at once. Labels of the same length are stacked into
+    one ``uint8`` array and hashed a column at a time, where the byte
+    arithmetic wraps modulo 256 by itself.
+
+    >>> hash_array([b"HASH", b"rn", b"qp", b"cm", b""]).tolist()
+    [52, 0, 1, 0, 0]
+    """
+    hashes = np.zeros(len(labels), dtype=np.uint8)
+    order = sorted(range(len(labels)), key=lambda i: len(labels[i]))
+    for length, group in groupby(order, key=lambda i: len(labels[i])):
+        indexes = list(group)
+        data = b"".join(labels[i] for i in indexes)
+        columns = np.frombuffer(data, dtype=np.uint8).reshape(len(indexes), length)
+        state = np.zeros(len(indexes), dtype=np.uint8)
+        for column in columns.T:
+            state = (state + column) * np.uint8(17)
+        hashes[indexes] = state
+
+    return hashes
+
+
+def split_stream(stream: BinaryIO, buffer_size: int = BUFFER_SIZE) -> Iterator[bytes]:
+    """
+    Comma separated steps read ``buffer_size`` bytes at a time. Only the
+    unfinished step at the end of each buffer is carried over to the next.
+
+    >>> from io import BytesIO
+    >>> list(split_stream(BytesIO(b"rn=1,cm-,qp=3\\n"), buffer_size=3))
+    [b'rn=1', b'cm-', b'qp=3']
+    """
+    tail = b""
+    while chunk := stream.read(buffer_size):
+        *steps, tail = (tail + chunk).split(b",")
+        for step in steps:
+            yield step.strip()
+
+    if tail := tail.strip():
+        yield tail
+
 
-    boxes = defaultdict(list)
-    for k, v in hashmap.items():
-        boxes[hash_algorithm(k)].append(v)
+def read_steps(path: Path) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        yield from split_stream(f)
+
+
+def parse_step(step: bytes) -> tuple[bytes, int | None]:
+    """
+    >>> parse_step(b"rn=1"), parse_step(b"cm-")
+    ((b'rn', 1), (b'cm', None))
+    """
+    if step.endswith(b"-"):
+        return step[:-1], None
+
+    label, lens = step.split(b"=")
+    return label, int(lens)
+
+
+@dataclass
+class Box:
+    """
+    Lenses in slot order. Every lens gets the next insertion number, and the
+    binary indexed trees over those numbers give a lens's slot and the focal
+    lengths behind it, which is what a change in the box's power depends on.
 
-    for box, lenses in boxes.items():
-        for slot, lens in enumerate(lenses, 1):
-            yield (box + 1) * slot * lens
+    >>> box = Box()
+    >>> box.put(b"rn", 1), box.put(b"cm", 2), box.put(b"rn", 3), box.remove(b"rn")
+    (1, 4, 2, -5)
+    >>> list(box.lenses)
+    [b'cm']
+    """
+
+    lenses: dict[bytes, tuple[int, int]] = field(default_factory=dict)
+    counts: Fenwick = field(default_factory=lambda: Fenwick(MIN_BOX_CAPACITY))
+    focals: Fenwick = field(default_factory=lambda: Fenwick(MIN_BOX_CAPACITY))
+    inserted: int = 0
+    focal_total: int = 0
+
+    def slot(self, number: int) -> int:
+        return self.counts.prefix(number + 1)
+
+    def put(self, label: bytes, focal: int) -> int:
+        """Insert or replace a lens, returning the change in the box's power."""
+        if (lens := self.lenses.get(label)) is not None:
+            number, old = lens
+            self.lenses[label] = number, focal
+            self.focals.add(number, focal - old)
+            self.focal_total += focal - old
+            return self.slot(number) * (focal - old)
+
+        if self.inserted == self.counts.size:
+            self.compact()
+
+        number = self.inserted
+        self.inserted += 1
+        self.lenses[label] = number, focal
+        self.counts.add(number, 1)
+        self.focals.add(number, focal)
+        self.focal_total += focal
+        return len(self.lenses) * focal
+
+    def remove(self, label: bytes) -> int:
+        """Remove a lens, returning the change in the box's power."""
+        if (lens := self.lenses.pop(label, None)) is None:
+            return 0
+
+        number, focal = lens
+        behind = self.focal_total - self.focals.prefix(number + 1)
+        delta = -self.slot(number) * focal - behind
+        self.counts.add(number, -1)
+        self.focals.add(number, -focal)
+        self.focal_total -= focal
+        return delta
+
+    def compact(self) -> None:
+        """Renumber the live lenses once the insertion numbers run out."""
+        capacity = max(MIN_BOX_CAPACITY, 2 * len(self.lenses))
+        self.counts, self.focals = Fenwick(capacity), Fenwick(capacity)
+        for number, (label, (_, focal)) in enumerate(self.lenses.items()):
+            self.lenses[label] = number, focal
+            self.counts.add(number, 1)
+            self.focals.add(number, focal)
+        self.inserted = len(self.lenses)
+
+
+@dataclass
+class HashMap:
+    """
+    The HASHMAP procedure with its focusing power kept up to date after every
+    step.
+
+    >>> hashmap = HashMap()
+    >>> list(hashmap.powers(EXAMPLE.split(b","), every=3))
+    [7, 21, 81]
+    >>> hashmap.power
+    145
+    """
+
+    boxes: list[Box] = field(default_factory=lambda: [Box() for _ in range(BOX_COUNT)])
+    power: int = 0
+
+    def apply(self, label: bytes, focal: int | None) -> int:
+        box = hash_label(label)
+        if focal is None:
+            delta = self.boxes[box].remove(label)
+        else:
+            delta = self.boxes[box].put(label, focal)
+        self.power += (box + 1) * delta
+        return self.power
+
+    def powers(self, steps: Iterable[bytes], every: int = 1) -> Iterator[int]:
+        """Focusing power after every ``every``-th step."""
+        powers = (self.apply(*parse_step(step)) for step in steps)
+        return islice(powers, every - 1, None, every)
+
+
+def totals(steps: Iterable[bytes]) -> tuple[int, int]:
+    """
+    Both parts in a single pass over the steps.
+
+    >>> totals(EXAMPLE.split(b","))
+    (1320, 145)
+    """
+    verification = 0
+    hashmap = HashMap()
+    for step in steps:
+        label, focal = parse_step(step)
+        verification += hash_bytes(step[len(label) :], hash_label(label))
+        hashmap.apply(label, focal)
+
+    return verification, hashmap.power
+
+
+def part1(path: Path):
+    return sum(map(hash_bytes, read_steps(path)))
+
+
+def array_part1(path: Path) -> int:
+    return int(hash_array(path.read_bytes().strip().split(b",")).sum(dtype=np.int64))
+
+
+def part2(path: Path):
+    return totals(read_steps(path))[1]
 
 
 def run(path: Path) -> tuple[int, int]:
-    return part1(path), part2(path)
+    return totals(read_steps(path))
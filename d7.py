@@ -1,9 +1,15 @@
-from collections import Counter
+import heapq
+import struct
+from dataclasses import dataclass, field
 from enum import Enum, auto
+from itertools import batched
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import Iterable, Iterator, Self
 
-from common import collect_sum, read_lines
+from common import Fenwick, read_lines
+
+type Signature = tuple[int, ...]
 
 
 class HandType(int, Enum):
@@ -31,30 +37,60 @@ class HandType(int, Enum):
         True
         >>> HandType.from_hand("JJJJK", joker=True) == HandType.FIVE_OF_A_KIND
         True
+        >>> HandType.from_hand("KTJJT") == HandType.TWO_PAIR
+        True
         """
-        counter = Counter(hand)
-        if joker:
-            jokers = counter.pop("J", 0)
-            card = counter.most_common(1)[0][0] if counter else "J"
-            counter[card] += jokers
-
-        match counter.most_common(2):
-            case (_, 1), (_, 1):
-                return cls.HIGH_CARD
-            case (_, 2), (_, 1):
-                return cls.ONE_PAIR
-            case (_, 2), (_, 2):
-                return cls.TWO_PAIR
-            case (_, 3), (_, 1):
-                return cls.THREE_OF_A_KIND
-            case (_, 3), (_, 2):
-                return cls.FULL_HOUSE
-            case (_, 4), _:
-                return cls.FOUR_OF_A_KIND
-            case [(_, 5)]:
-                return cls.FIVE_OF_A_KIND
-            case _ as other:
-                assert False, other
+        jokers = hand.count("J") if joker else 0
+        if jokers:
+            hand = hand.replace("J", "")
+        return HAND_TYPES[signature(hand), jokers]
+
+
+def signature(hand: str) -> Signature:
+    """
+    Card counts of a hand, largest first.
+
+    >>> signature("KTJJT")
+    (2, 2, 1)
+    """
+    return tuple(sorted(map(hand.count, set(hand)), reverse=True))
+
+
+def partitions(n: int, largest: int | None = None) -> Iterator[Signature]:
+    """
+    >>> list(partitions(3))
+    [(3,), (2, 1), (1, 1, 1)]
+    >>> list(partitions(0))
+    [()]
+    """
+    if n == 0:
+        yield ()
+        return
+
+    for first in range(min(n, largest or n), 0, -1):
+        for rest in partitions(n - first, first):
+            yield first, *rest
+
+
+BASE_HAND_TYPES: dict[Signature, HandType] = {
+    (1, 1, 1, 1, 1): HandType.HIGH_CARD,
+    (2, 1, 1, 1): HandType.ONE_PAIR,
+    (2, 2, 1): HandType.TWO_PAIR,
+    (3, 1, 1): HandType.THREE_OF_A_KIND,
+    (3, 2): HandType.FULL_HOUSE,
+    (4, 1): HandType.FOUR_OF_A_KIND,
+    (5,): HandType.FIVE_OF_A_KIND,
+}
+
+# Jokers always join the most common card, so every (signature, jokers) pair
+# of a five card hand resolves to a hand type ahead of time.
+HAND_TYPES: dict[tuple[Signature, int], HandType] = {
+    (counts, jokers): BASE_HAND_TYPES[
+        (counts[0] + jokers, *counts[1:]) if counts else (jokers,)
+    ]
+    for jokers in range(6)
+    for counts in partitions(5 - jokers)
+}
 
 
 STRENGTH_MAP = {
@@ -73,9 +109,14 @@ STRENGTH_MAP = {
     "2": 2,
 }
 
+JOKER_STRENGTH_MAP = {**STRENGTH_MAP, "J": 1}
+
+CARD_BITS = 4
+HAND_SIZE = 5
+
 
 def get_strength(hand: str, joker: bool = False) -> tuple[int, ...]:
-    strength_map = {**STRENGTH_MAP, "J": 1} if joker else STRENGTH_MAP
+    strength_map = JOKER_STRENGTH_MAP if joker else STRENGTH_MAP
     return tuple(strength_map[card] for card in hand)
 
 
@@ -83,19 +124,167 @@ def get_hand(line: str) -> str:
     return line.split()[0]
 
 
-def get_sort_key(hand: str, joker: bool = False) -> tuple[HandType, tuple[int, ...]]:
-    return HandType.from_hand(hand, joker), get_strength(hand, joker)
+def get_sort_key(hand: str, joker: bool = False) -> int:
+    """
+    Pack a hand into a single integer, the hand type in the high bits followed
+    by 4 bits of strength per card, so hands order by plain integer comparison.
+
+    >>> hex(get_sort_key("32T3K"))
+    '0x232a3d'
+    >>> get_sort_key("KTJJT", joker=True) > get_sort_key("QQQJA", joker=True)
+    True
+    """
+    key = int(HandType.from_hand(hand, joker))
+    for strength in get_strength(hand, joker):
+        key = key << CARD_BITS | strength
+    return key
+
+
+def parse_bids(lines: Iterable[str]) -> Iterator[tuple[str, int]]:
+    for line in lines:
+        hand, bid = line.split()
+        yield hand, int(bid)
+
+
+def total_winnings(lines: Iterable[str], joker: bool = False) -> int:
+    keyed = sorted((get_sort_key(hand, joker), bid) for hand, bid in parse_bids(lines))
+    return sum(rank * bid for rank, (_, bid) in enumerate(keyed, 1))
+
+
+KEY_BOUND = (max(HandType) + 1) << (CARD_BITS * HAND_SIZE)
+
+
+@dataclass
+class Ordering:
+    joker: bool
+    counts: Fenwick = field(default_factory=lambda: Fenwick(KEY_BOUND))
+    bids: Fenwick = field(default_factory=lambda: Fenwick(KEY_BOUND))
+    winnings: int = 0
+
+    def shift(self, key: int, bid: int, bid_total: int) -> int:
+        """Winnings contributed by ``key`` when it slots into the ranking."""
+        below = self.counts.prefix(key)
+        above = bid_total - self.bids.prefix(key + 1)
+        return (below + 1) * bid + above
+
+    def insert(self, key: int, bid: int, bid_total: int) -> None:
+        self.winnings += self.shift(key, bid, bid_total)
+        self.counts.add(key, 1)
+        self.bids.add(key, bid)
+
+    def remove(self, key: int, bid: int, bid_total: int) -> None:
+        self.counts.add(key, -1)
+        self.bids.add(key, -bid)
+        self.winnings -= self.shift(key, bid, bid_total - bid)
+
+
+@dataclass
+class RankedHands:
+    """
+    Hands ranked under both orderings as they arrive, total winnings are kept
+    up to date in O(log n) per insert or removal.
+
+    >>> ranked = RankedHands()
+    >>> for hand, bid in [("32T3K", 765), ("T55J5", 684), ("KK677", 28)]:
+    ...     ranked[hand] = bid
+    >>> ranked.winnings
+    (2873, 2873)
+    >>> ranked["KTJJT"] = 220
+    >>> ranked["QQQJA"] = 483
+    >>> ranked.winnings
+    (6440, 5905)
+    >>> del ranked["KTJJT"]
+    >>> lines = ["32T3K 765", "T55J5 684", "KK677 28", "QQQJA 483"]
+    >>> ranked.winnings == (part1(lines), part2(lines))
+    True
+    """
+
+    bids: dict[str, int] = field(default_factory=dict)
+    orderings: tuple[Ordering, Ordering] = field(
+        default_factory=lambda: (Ordering(joker=False), Ordering(joker=True))
+    )
+    bid_total: int = 0
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> Self:
+        ranked = cls()
+        for hand, bid in parse_bids(lines):
+            ranked[hand] = bid
+        return ranked
+
+    @property
+    def winnings(self) -> tuple[int, int]:
+        standard, joker = self.orderings
+        return standard.winnings, joker.winnings
+
+    def __len__(self) -> int:
+        return len(self.bids)
+
+    def __contains__(self, hand: str) -> bool:
+        return hand in self.bids
+
+    def __getitem__(self, hand: str) -> int:
+        return self.bids[hand]
+
+    def __setitem__(self, hand: str, bid: int) -> None:
+        if hand in self.bids:
+            del self[hand]
+
+        for ordering in self.orderings:
+            ordering.insert(get_sort_key(hand, ordering.joker), bid, self.bid_total)
+        self.bids[hand] = bid
+        self.bid_total += bid
+
+    def __delitem__(self, hand: str) -> None:
+        bid = self.bids.pop(hand)
+        for ordering in self.orderings:
+            ordering.remove(get_sort_key(hand, ordering.joker), bid, self.bid_total)
+        self.bid_total -= bid
+
+
+RECORD = struct.Struct("<IQ")
+RUN_BUFFER = 4096
+
+
+def write_run(path: Path, run: list[tuple[int, int]]) -> None:
+    with path.open("wb") as f:
+        for key, bid in run:
+            f.write(RECORD.pack(key, bid))
+
+
+def read_run(path: Path) -> Iterator[tuple[int, int]]:
+    with path.open("rb") as f:
+        while block := f.read(RECORD.size * RUN_BUFFER):
+            yield from RECORD.iter_unpack(block)
+
+
+def external_winnings(
+    lines: Iterable[str], joker: bool = False, chunk_size: int = 1_000_000
+) -> int:
+    """
+    Total winnings with at most ``chunk_size`` hands in memory: sorted runs
+    are spilled to temporary files and merged back in rank order.
+
+    >>> lines = ["32T3K 765", "T55J5 684", "KK677 28", "KTJJT 220", "QQQJA 483"]
+    >>> external_winnings(lines, chunk_size=2), external_winnings(lines, True, 2)
+    (6440, 5905)
+    """
+    with TemporaryDirectory() as directory:
+        runs = []
+        for i, chunk in enumerate(batched(parse_bids(lines), chunk_size)):
+            run = sorted((get_sort_key(hand, joker), bid) for hand, bid in chunk)
+            runs.append(Path(directory) / f"run{i}")
+            write_run(runs[-1], run)
+
+        merged = heapq.merge(*map(read_run, runs))
+        return sum(rank * bid for rank, (_, bid) in enumerate(merged, 1))
 
 
-@collect_sum
-def part1(lines: Iterable[str]) -> Iterator[int]:
-    lines = sorted(lines, key=lambda line: get_sort_key(get_hand(line)))
-    for rank, line in enumerate(lines, 1):
-        yield rank * int(line.split()[1])
+def part1(lines: Iterable[str]) -> int:
+    return total_winnings(lines)
 
 
-@collect_sum
-def part2(lines: Iterable[str]) -> Iterator[int]:
+def part2(lines: Iterable[str]) -> int:
     """
     >>> part2(
     ...     [
@@ -108,9 +297,7 @@ def part2(lines: Iterable[str]) -> Iterator[int]:
     ... )
     5905
     """
-    lines = sorted(lines, key=lambda line: get_sort_key(get_hand(line), joker=True))
-    for rank, line in enumerate(lines, 1):
-        yield rank * int(line.split()[1])
+    return total_winnings(lines, joker=True)
 
 
 def run(path: Path) -> tuple[int, int]:
@@ -1,17 +1,61 @@
 import math
 from dataclasses import dataclass
-from itertools import cycle
 from pathlib import Path
-from typing import Iterable, Iterator, Self
-
-import parse
+from typing import Callable, Iterable, Iterator, Self
 
 from common import read_lines
 
 type Instruction = str
 type Node = str
 
-line_parser = parse.compile("{node} = ({left}, {right})")
+EXAMPLE = [
+    "LLR",
+    "",
+    "AAA = (BBB, BBB)",
+    "BBB = (AAA, ZZZ)",
+    "ZZZ = (ZZZ, ZZZ)",
+]
+
+EXAMPLE_GHOSTS = [
+    "LR",
+    "",
+    "11A = (11B, XXX)",
+    "11B = (XXX, 11Z)",
+    "11Z = (11B, XXX)",
+    "22A = (22B, XXX)",
+    "22B = (22C, 22C)",
+    "22C = (22Z, 22Z)",
+    "22Z = (22B, 22B)",
+    "XXX = (XXX, XXX)",
+]
+
+EXAMPLE_OFFSETS = [
+    "L",
+    "",
+    "11A = (11B, 11B)",
+    "11B = (11Z, 11Z)",
+    "11Z = (11B, 11B)",
+    "22A = (22Z, 22Z)",
+    "22Z = (22B, 22B)",
+    "22B = (22C, 22C)",
+    "22C = (22Z, 22Z)",
+]
+
+
+def parse_line(line: str, number: int = 1) -> tuple[Node, Node, Node]:
+    """
+    Slice a ``AAA = (BBB, CCC)`` line at its fixed offsets.
+
+    >>> parse_line("AAA = (BBB, CCC)")
+    ('AAA', 'BBB', 'CCC')
+    >>> parse_line("AAA = BBB, CCC", 7)
+    Traceback (most recent call last):
+        ...
+    ValueError: Malformed node on line 7: 'AAA = BBB, CCC'
+    """
+    if len(line) != 16 or line[3:7] != " = (" or line[10:12] != ", " or line[15] != ")":
+        raise ValueError(f"Malformed node on line {number}: {line!r}")
+    return line[0:3], line[7:10], line[12:15]
 
 
 @dataclass
@@ -22,13 +66,11 @@ class Graph:
         return self.paths[from_node][0 if instruction == "L" else 1]
 
     @classmethod
-    def from_lines(cls, lines: Iterable[str]) -> Self:
+    def from_lines(cls, lines: Iterable[str], start: int = 1) -> Self:
         paths = {}
-        for line in lines:
-            result = line_parser.parse(line)
-            assert isinstance(result, parse.Result)
-
-            paths[result["node"]] = (result["left"], result["right"])
+        for number, line in enumerate(lines, start):
+            node, left, right = parse_line(line, number)
+            paths[node] = (left, right)
 
         return cls(paths)
 
@@ -43,48 +85,295 @@ class Graph:
             yield node
 
 
-def parse_input(lines: Iterable[str]) -> tuple[str, Graph]:
-    lines = iter(lines)
-    instructions = next(lines)
-    next(lines)  # skip a line
+@dataclass
+class IndexedGraph:
+    """
+    Graph with nodes interned to dense ids and list-backed left/right tables.
 
-    graph = Graph.from_lines(lines)
-    return instructions, graph
+    >>> paths = {"AAA": ("BBB", "AAA"), "BBB": ("AAA", "AAA")}
+    >>> graph = IndexedGraph.from_graph(Graph(paths))
+    >>> graph.ids["BBB"], graph.left, graph.right
+    (1, [1, 0], [0, 0])
+    """
+
+    names: list[Node]
+    ids: dict[Node, int]
+    left: list[int]
+    right: list[int]
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> Self:
+        names = list(graph.nodes())
+        ids = {node: i for i, node in enumerate(names)}
+        left = [ids[graph.paths[node][0]] for node in names]
+        right = [ids[graph.paths[node][1]] for node in names]
+        return cls(names, ids, left, right)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str], start: int = 1) -> Self:
+        """
+        Intern nodes as they are first seen, without building a ``Graph``.
+
+        >>> graph = IndexedGraph.from_lines(["AAA = (BBB, BBB)", "BBB = (AAA, ZZZ)"])
+        Traceback (most recent call last):
+            ...
+        ValueError: Nodes are never defined: ['ZZZ']
+        """
+        ids: dict[Node, int] = {}
+        left: list[int] = []
+        right: list[int] = []
+        defined: list[bool] = []
+        for number, line in enumerate(lines, start):
+            node, *targets = (
+                ids.setdefault(name, len(ids)) for name in parse_line(line, number)
+            )
+            if missing := len(ids) - len(defined):
+                left.extend([-1] * missing)
+                right.extend([-1] * missing)
+                defined.extend([False] * missing)
+            left[node], right[node] = targets
+            defined[node] = True
+
+        names = list(ids)
+        if not all(defined):
+            undefined = [name for name, d in zip(names, defined) if not d]
+            raise ValueError(f"Nodes are never defined: {undefined}")
+        return cls(names, ids, left, right)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def moves(self, instructions: str) -> list[list[int]]:
+        return [self.left if i == "L" else self.right for i in instructions]
+
+    def mask(self, predicate: Callable[[Node], bool]) -> list[bool]:
+        return [predicate(node) for node in self.names]
+
+
+@dataclass
+class JumpTable:
+    """
+    Binary lifting over whole passes of the instruction string.
+
+    ``jumps[j][n]`` is the node reached from ``n`` after ``2 ** j`` passes and
+    ``hits[j][n]`` the first step within those passes that stands on a target
+    node, or -1 if there is none. ``offsets[n]`` lists every step of a single
+    pass from ``n`` that stands on a target.
+
+    >>> _, indexed = parse_input(EXAMPLE)
+    >>> table = JumpTable.build(indexed, "LLR", indexed.mask(lambda n: n == "ZZZ"))
+    >>> table.first_hit(indexed.ids["AAA"])
+    6
+    >>> indexed.names[table.after(indexed.ids["AAA"], 5)]
+    'BBB'
+    >>> [indexed.names[table.after(indexed.ids["AAA"], k)] for k in (24, 10**6 + 1)]
+    ['ZZZ', 'ZZZ']
+    """
+
+    moves: list[list[int]]
+    jumps: list[list[int]]
+    hits: list[list[int]]
+    offsets: list[list[int]]
 
+    @classmethod
+    def build(cls, graph: IndexedGraph, instructions: str, targets: list[bool]) -> Self:
+        moves = graph.moves(instructions)
+        ends: list[int] = []
+        offsets: list[list[int]] = []
+        for node in range(len(graph)):
+            node_hits = []
+            for step, move in enumerate(moves):
+                if targets[node]:
+                    node_hits.append(step)
+                node = move[node]
+            ends.append(node)
+            offsets.append(node_hits)
+
+        jumps = [ends]
+        hits = [[node_hits[0] if node_hits else -1 for node_hits in offsets]]
+        table = cls(moves, jumps, hits, offsets)
+        table.extend(len(graph).bit_length() + 1)
+        return table
+
+    def extend(self, levels: int) -> None:
+        """Add lifting levels until there are at least ``levels`` of them."""
+        while len(self.jumps) < levels:
+            jump, hit = self.jumps[-1], self.hits[-1]
+            span = len(self.moves) << (len(self.jumps) - 1)
+            self.jumps.append([jump[jump[n]] for n in range(len(jump))])
+            self.hits.append(
+                [
+                    (
+                        hit[n]
+                        if hit[n] >= 0
+                        else (hit[jump[n]] + span if hit[jump[n]] >= 0 else -1)
+                    )
+                    for n in range(len(jump))
+                ]
+            )
+
+    def after(self, node: int, steps: int) -> int:
+        """Node reached after ``steps`` steps, O(log(steps) + len(instructions))."""
+        passes, remainder = divmod(steps, len(self.moves))
+        self.extend(passes.bit_length())
+        for level, jump in enumerate(self.jumps):
+            if passes >> level & 1:
+                node = jump[node]
+        for move in self.moves[:remainder]:
+            node = move[node]
+        return node
+
+    def first_hit(self, node: int) -> int:
+        """Number of steps until the first target node, O(log(nodes))."""
+        steps = 0
+        for level in reversed(range(len(self.jumps))):
+            if self.hits[level][node] < 0:
+                node = self.jumps[level][node]
+                steps += len(self.moves) << level
+
+        if self.hits[0][node] < 0:
+            raise ValueError("Target is unreachable")
+        return steps + self.hits[0][node]
+
+
+@dataclass
+class Cycle:
+    """
+    Every step at which a walk stands on a target: the hits before ``tail``,
+    then ``residues`` repeating every ``length`` steps from ``tail`` onwards.
+
+    >>> _, indexed = parse_input(EXAMPLE_GHOSTS)
+    >>> table = JumpTable.build(indexed, "LR", indexed.mask(lambda n: n[-1] == "Z"))
+    >>> Cycle.find(table, indexed.ids["22A"])
+    Cycle(tail=2, length=6, tail_hits=[], residues=[3, 0])
+    """
+
+    tail: int
+    length: int
+    tail_hits: list[int]
+    residues: list[int]
+
+    @classmethod
+    def find(cls, table: JumpTable, start: int) -> Self:
+        """Walk whole passes until one repeats, O(nodes) table lookups."""
+        passes = len(table.moves)
+        block = table.jumps[0]
+        seen: dict[int, int] = {}
+        order: list[int] = []
+        node = start
+        while node not in seen:
+            seen[node] = len(order)
+            order.append(node)
+            node = block[node]
+
+        tail = seen[node] * passes
+        length = (len(order) - seen[node]) * passes
+        hits = [
+            i * passes + offset
+            for i, node in enumerate(order)
+            for offset in table.offsets[node]
+        ]
+        return cls(
+            tail,
+            length,
+            [hit for hit in hits if hit < tail],
+            [hit % length for hit in hits if hit >= tail],
+        )
 
-def get_cycle(start: Node, graph: Graph, instructions: str) -> int:
-    for i, node in enumerate(iterable=graph.path(start, cycle(instructions))):
-        if node[-1] == "Z":
-            return i
-    assert False
+    def __contains__(self, step: int) -> bool:
+        if step < self.tail:
+            return step in self.tail_hits
+        return step % self.length in self.residues
 
+    def hits(self, until: int) -> Iterator[int]:
+        """All hits before ``until`` in ascending order."""
+        yield from (hit for hit in self.tail_hits if hit < until)
+        for base in range(self.tail - self.tail % self.length, until, self.length):
+            for residue in sorted(self.residues):
+                if self.tail <= base + residue < until:
+                    yield base + residue
 
-def part1(instructions: Iterable[Instruction], graph: Graph) -> int:
-    start = "AAA"
-    for i, node in enumerate(graph.path(start, instructions)):
-        if node == "ZZZ":
-            return i
 
-    assert False
+def crt(a: tuple[int, int], b: tuple[int, int]) -> tuple[int, int] | None:
+    """
+    Combine ``x = r (mod m)`` congruences given as ``(r, m)``, moduli need not
+    be coprime.
+
+    >>> crt((2, 4), (4, 6))
+    (10, 12)
+    >>> crt((1, 4), (2, 6)) is None
+    True
+    """
+    (r1, m1), (r2, m2) = a, b
+    gcd = math.gcd(m1, m2)
+    if (r2 - r1) % gcd:
+        return None
+
+    lcm = m1 // gcd * m2
+    k = (r2 - r1) // gcd * pow(m1 // gcd, -1, m2 // gcd) % (m2 // gcd)
+    return (r1 + m1 * k) % lcm, lcm
+
+
+def first_common(cycles: list[Cycle]) -> int:
+    """
+    Earliest step that every cycle hits.
+
+    >>> first_common([Cycle(0, 2, [], [0]), Cycle(2, 3, [1], [1])])
+    4
+    """
+    tail = max(cycle.tail for cycle in cycles)
+    first, *others = cycles
+    for step in first.hits(tail):
+        if all(step in other for other in others):
+            return step
+
+    congruences = {(0, 1)}
+    for cycle in cycles:
+        congruences = {
+            combined
+            for congruence in congruences
+            for residue in cycle.residues
+            if (combined := crt(congruence, (residue, cycle.length)))
+        }
+
+    if not congruences:
+        raise ValueError("Walks never line up")
+    return min(tail + (r - tail) % m for r, m in congruences)
+
+
+def parse_input(lines: Iterable[str]) -> tuple[str, IndexedGraph]:
+    lines = iter(lines)
+    instructions = next(lines)
+    next(lines)  # skip a line
+
+    graph = IndexedGraph.from_lines(lines, start=3)
+    return instructions, graph
 
 
-def product(values: Iterable[int]) -> int:
-    value = 1
-    for v in values:
-        value *= v
+def part1(instructions: str, graph: IndexedGraph) -> int:
+    """
+    >>> part1(*parse_input(EXAMPLE))
+    6
+    """
+    table = JumpTable.build(graph, instructions, graph.mask(lambda n: n == "ZZZ"))
+    return table.first_hit(graph.ids["AAA"])
 
-    return value
 
+def part2(instructions: str, graph: IndexedGraph) -> int:
+    """
+    >>> part2(*parse_input(EXAMPLE_GHOSTS))
+    6
 
-def part2(instructions: str, graph: Graph) -> int:
-    start_nodes = [node for node in graph.nodes() if node[-1] == "A"]
+    Hits that are offset from the start of their cycle still line up:
 
-    # From observation these are whole cycles
-    cycles = [get_cycle(start_node, graph, instructions) for start_node in start_nodes]
-    gcd = math.gcd(*cycles)
-    return product(cycles) // gcd ** (len(cycles) - 1)
+    >>> part2(*parse_input(EXAMPLE_OFFSETS))
+    4
+    """
+    table = JumpTable.build(graph, instructions, graph.mask(lambda n: n[-1] == "Z"))
+    start_nodes = [graph.ids[node] for node in graph.names if node[-1] == "A"]
+    return first_common([Cycle.find(table, start) for start in start_nodes])
 
 
 def run(path: Path) -> tuple[int, int]:
     instructions, graph = parse_input(lines=read_lines(path))
-    return part1(cycle(instructions), graph), part2(instructions, graph)
+    return part1(instructions, graph), part2(instructions, graph)
@@ -1,5 +1,9 @@
+from dataclasses import dataclass
+from functools import cache
+from itertools import islice, repeat
+from math import comb
 from pathlib import Path
-from typing import Iterator
+from typing import Iterable, Iterator, Self
 
 from common import collect_sum, read_lines
 
@@ -34,8 +38,117 @@ def get_prev_value(sequence: list[int]) -> int:
     return sequence[0] - get_prev_value(differentiate(sequence))
 
 
+@cache
+def weights(length: int) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """
+    Binomial weights giving the next and previous value of a sequence as a
+    dot product, assuming its ``length``-th differences are zero.
+
+    >>> weights(3)
+    ((1, -3, 3), (3, -3, 1))
+    """
+    forward = tuple((-1) ** (length - 1 - i) * comb(length, i) for i in range(length))
+    backward = tuple((-1) ** i * comb(length, i + 1) for i in range(length))
+    return forward, backward
+
+
+def extrapolate(sequences: Iterable[list[int]]) -> tuple[int, int]:
+    """
+    Sum of next and previous values of every sequence in one pass. The weights
+    are linear so sequences of equal length are summed column-wise first and
+    only the column totals are weighted.
+
+    >>> extrapolate(
+    ...     [[0, 3, 6, 9, 12, 15], [1, 3, 6, 10, 15, 21], [10, 13, 16, 21, 30, 45]]
+    ... )
+    (114, 2)
+    """
+    totals: dict[int, list[int]] = {}
+    for sequence in sequences:
+        column = totals.setdefault(len(sequence), [0] * len(sequence))
+        for i, value in enumerate(sequence):
+            column[i] += value
+
+    next_total, prev_total = 0, 0
+    for length, column in totals.items():
+        forward, backward = weights(length)
+        next_total += sum(w * v for w, v in zip(forward, column))
+        prev_total += sum(w * v for w, v in zip(backward, column))
+
+    return next_total, prev_total
+
+
+def parse_sequences(path: Path) -> Iterator[list[int]]:
+    for line in read_lines(path):
+        yield list(map(int, line.split()))
+
+
+@dataclass
+class DifferenceTable:
+    """
+    The first and last diagonals of a sequence's difference table, enough to
+    extrapolate any number of values in either direction in O(depth) each.
+
+    >>> table = DifferenceTable.from_sequence([10, 13, 16, 21, 30, 45])
+    >>> table.first, table.last
+    ([10, 3, 0, 2], [45, 15, 6, 2])
+    >>> list(islice(table.forward(), 3))
+    [68, 101, 146]
+    >>> list(islice(table.backward(), 2))
+    [5, -4]
+    """
+
+    first: list[int]
+    last: list[int]
+
+    @classmethod
+    def from_sequence(cls, sequence: list[int]) -> Self:
+        first, last = [], []
+        while not all(value == 0 for value in sequence):
+            first.append(sequence[0])
+            last.append(sequence[-1])
+            sequence = differentiate(sequence)
+
+        return cls(first, last)
+
+    def forward(self) -> Iterator[int]:
+        diagonal = list(self.last)
+        while diagonal:
+            for i in reversed(range(len(diagonal) - 1)):
+                diagonal[i] += diagonal[i + 1]
+            yield diagonal[0]
+
+        yield from repeat(0)
+
+    def backward(self) -> Iterator[int]:
+        diagonal = list(self.first)
+        while diagonal:
+            for i in reversed(range(len(diagonal) - 1)):
+                diagonal[i] -= diagonal[i + 1]
+            yield diagonal[0]
+
+        yield from repeat(0)
+
+
+def predict(
+    sequences: Iterable[list[int]], ahead: int, behind: int = 0
+) -> Iterator[tuple[list[int], list[int]]]:
+    """
+    Stream ``ahead`` values after and ``behind`` values before each sequence,
+    the values before are nearest first.
+
+    >>> list(predict([[1, 3, 6, 10, 15, 21]], ahead=2, behind=2))
+    [([28, 36], [0, 0])]
+    """
+    for sequence in sequences:
+        table = DifferenceTable.from_sequence(sequence)
+        after = list(islice(table.forward(), ahead))
+        before = list(islice(table.backward(), behind))
+        yield after, before
+
+
 def run(path: Path) -> tuple[int, int]:
-    return part1(path), part2(path)
+    return extrapolate(parse_sequences(path))
 
 
 @collect_sum